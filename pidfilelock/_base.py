@@ -1,28 +1,42 @@
 """Common base for both PIDLock and PIDFile."""
-import contextlib
-import io
 import os
 import pathlib
 import typing
 
+_PID_READ_SIZE = 32  # The PID is a decimal number and even with the largest pid_max it is way shorter than this
 
-class PIDBase(contextlib.AbstractContextManager):
+
+class PIDBase:
     """The common base for both PIDLock and PIDFile implementing the common access routines to the PID file."""
 
+    # Note: we intentionally do not inherit contextlib.AbstractContextManager as it has no __slots__. Subclasses
+    # implement the context manager protocol and thus are still recognized as its instances.
+    __slots__ = ("path", "_path_str", "fileno", "_pid_bytes")
+
     def __init__(self, path: typing.Union[str, pathlib.Path]):
         """Shared initializer for PID file lock handling classes.
 
         path: The path to the lock file
         """
         self.path = path if isinstance(path, pathlib.Path) else pathlib.Path(path)
+        self._path_str = os.fspath(self.path)  # Plain string used for syscalls to avoid pathlib overhead
         self.fileno: typing.Optional[int] = None  # Note: we use this to internally detect lock
+        self._pid_bytes: typing.Optional[bytes] = None  # The content of the PID file cached while we hold the lock
+
+    @staticmethod
+    def _same_file(a_stat: os.stat_result, b_stat: os.stat_result) -> bool:
+        """Check if two stat results describe the same file (inode numbers are unique only per device)."""
+        return a_stat.st_ino == b_stat.st_ino and a_stat.st_dev == b_stat.st_dev
 
     @property
     def pid(self) -> int:
         """Read the content of the PID file."""
-        assert self.fileno is not None
-        os.lseek(self.fileno, 0, os.SEEK_SET)
-        return int(os.read(self.fileno, io.DEFAULT_BUFFER_SIZE))
+        fileno = self.fileno
+        if fileno is None:
+            raise RuntimeError("The PID file is not locked.")
+        if self._pid_bytes is None:  # The content can't change while we hold the lock so we read it only once
+            self._pid_bytes = os.pread(fileno, _PID_READ_SIZE, 0)
+        return int(self._pid_bytes)
 
     @property
     def is_locked(self) -> bool:
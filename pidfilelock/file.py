@@ -4,7 +4,7 @@ import logging
 import os
 
 from ._base import PIDBase as _PIDBase
-from .tools import pid_is_running
+from .tools import flock, pid_is_running
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +12,8 @@ logger = logging.getLogger(__name__)
 class PIDFile(_PIDBase):
     """The class that won't create the lock but allows reading it."""
 
+    __slots__ = ()
+
     def lock(self) -> bool:
         """Lock the PID file for reading.
 
@@ -21,30 +23,58 @@ class PIDFile(_PIDBase):
 
         Returns True if lock was succesfull or False otherwise.
         """
-        assert self.fileno is None, "Lock is already obtained."
+        if self.fileno is not None:
+            raise RuntimeError("Lock is already obtained.")
         while True:
             try:
-                fileno = os.open(self.path, os.O_RDONLY)
+                fileno = os.open(self._path_str, os.O_RDONLY | os.O_CLOEXEC | os.O_NOFOLLOW)
             except FileNotFoundError:
                 return False  # No file means no lock
-            fcntl.flock(fileno, fcntl.LOCK_SH)
-            if self.path.stat().st_ino != os.fstat(fileno).st_ino:
-                logger.debug(
-                    "The PID lock file was removed between us opening it and acquiring read lock '%s'. Attempting again.",
-                    self.path,
-                )
-                os.close(fileno)
-                continue
-            break
+            if self.adopt(fileno):
+                return True
+
+    def adopt(self, fileno: int) -> bool:
+        """Lock the PID file for reading using already opened file descriptor.
+
+        This is handy if you already have the PID file opened (for example after failed attempt to lock it with
+        PIDLock) as it saves the reopening of the file.
+
+        fileno: The file descriptor of the PID file. The ownership is passed to this object.
+
+        Returns True if lock was successful or False if file descriptor no longer references the PID file. The file
+        descriptor is closed in such case as well as when exception is raised.
+        """
+        try:
+            if self.fileno is not None:
+                raise RuntimeError("Lock is already obtained.")
+            flock(fileno, fcntl.LOCK_SH)
+            try:
+                pthstat = os.stat(self._path_str, follow_symlinks=False)
+            except FileNotFoundError:
+                pthstat = None  # The owner removed it while we were waiting for the lock
+            same = pthstat is not None and self._same_file(pthstat, os.fstat(fileno))
+        except BaseException:
+            os.close(fileno)
+            raise
+        if not same:
+            logger.debug(
+                "The PID lock file was removed between us opening it and acquiring read lock '%s'. Attempting again.",
+                self.path,
+            )
+            os.close(fileno)
+            return False
         self.fileno = fileno
         logger.debug("PID file read lock acquired '%s'", self.path)
         return True
 
     def unlock(self) -> None:
         """Unlock the read lock."""
-        assert self.fileno is not None, "Lock is already free."
-        os.close(self.fileno)
+        fileno = self.fileno
+        if fileno is None:
+            raise RuntimeError("Lock is already free.")
+        os.close(fileno)
         self.fileno = None
+        self._pid_bytes = None
 
     @property
     def pid(self):
@@ -61,14 +91,8 @@ class PIDFile(_PIDBase):
     @property
     def is_running(self) -> bool:
         """Check if there is running process with locked PID file."""
-        do_lock = self.fileno is None
-        if do_lock:
-            if not self.lock():
-                return False
-        res = pid_is_running(self.pid)
-        if do_lock:
-            self.unlock()
-        return res
+        pid = self.pid  # The read lock is held only for the read itself if it is not already held
+        return pid != -1 and pid_is_running(pid)
 
     def __enter__(self):
         """Enter context with PID file locked for reading.
@@ -78,5 +102,6 @@ class PIDFile(_PIDBase):
         return self, self.lock()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        """Unlock when leaving context."""
-        self.unlock()
+        """Unlock when leaving context (if lock was obtained)."""
+        if self.is_locked:
+            self.unlock()
@@ -1,20 +1,37 @@
 """The pidfilelock implementation."""
+import errno
 import fcntl
 import grp
-import io
 import logging
 import os
 import pathlib
 import stat
+import threading
+import time
 import typing
 
+from ._base import _PID_READ_SIZE
 from ._base import PIDBase as _PIDBase
-from .tools import pid_is_running
+from .tools import flock, flock_timeout, pid_is_running
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_LOCK_MODE = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH
 
+_MY_PID_BYTES = str(os.getpid()).encode()  # Our PID already encoded for the PID file
+
+_RETRY_DELAY_MIN = 0.01  # The initial delay in seconds before attempt to take over lock from running process
+_RETRY_DELAY_MAX = 1.0  # The maximum delay in seconds before attempt to take over lock from running process
+
+
+def _refresh_pid() -> None:
+    """Update our cached PID in the forked child."""
+    global _MY_PID_BYTES  # pylint: disable=global-statement
+    _MY_PID_BYTES = str(os.getpid()).encode()
+
+
+os.register_at_fork(after_in_child=_refresh_pid)
+
 
 class PIDLock(_PIDBase):
     """The primary pidfilelock class implementing the lock mechanism.
@@ -22,14 +39,20 @@ class PIDLock(_PIDBase):
     You should use this in the process you want to take lock in.
 
     TLDR; Always make sure that anyone who is going to lock the PID file has write access to the file as well as to the
-    directory that file is stored in. The directory can't have sticky bit set.
+    directory that file is stored in. The directory can't have sticky bit set. The lock file can't be a symbolic link.
     To take the lock you have to make sure that caller has write permission to both the lock file as well as directory
     it resides in. The need for write permission on directory should be clear, without it it is not possible to create
     the lock file. The need for lock file to be writable might not be clear as owner of the lock removes it in the end.
     Problem is that it might not be true every time and we have to be able to safely clean it. That consist of locking
     and removing it. To make this work the directory can't have sticky bit set as otherwise we can't remove it.
+
+    The lock uses open file description locks where available. Those are not visible to flock and thus mixing this
+    implementation with anyone locking the same file with flock (such as previous versions of this library or flock(1)
+    tool) is not supported.
     """
 
+    __slots__ = ("mode", "group", "unsafe_cleanup")
+
     def __init__(
         self,
         path: typing.Union[str, pathlib.Path],
@@ -58,79 +81,142 @@ class PIDLock(_PIDBase):
         if self.fileno is not None:
             self.unlock()
 
-    def lock(self, block: bool = True) -> bool:
+    def lock(self, block: bool = True, timeout: typing.Optional[float] = None) -> bool:
         """Lock the PID file and store our PID to it.
 
         block: block execution until we acquire the lock.
+        timeout: the maximum number of seconds to block for. This is implemented using SIGALRM and thus it can be used
+          only from the main thread (ValueError is raised otherwise) and not when there is SIGALRM handler installed
+          outside of Python or interval timer armed to expire sooner than timeout (RuntimeError is raised). It has no
+          effect if block is set to False.
 
-        Returns True if lock was succesfull or False otherwise. It never returns False if block is set to True.
+        Returns True if lock was succesfull or False otherwise. It never returns False if block is set to True and no
+        timeout is specified.
         """
-        assert self.fileno is None, "Lock is already obtained."
+        fileno = self._lock(block, timeout)
+        if fileno is not None:
+            os.close(fileno)
+            return False
+        return True
+
+    def _lock(self, block: bool, timeout: typing.Optional[float] = None) -> typing.Optional[int]:
+        """Implementation of lock.
+
+        Returns None if lock was successful. Otherwise it returns the open file descriptor of the PID file locked by
+        someone else. It is up to the caller to close it.
+        """
+        if self.fileno is not None:
+            raise RuntimeError("Lock is already obtained.")
+        if block and timeout is not None and threading.current_thread() is not threading.main_thread():
+            raise ValueError("Lock with timeout can be used only from the main thread.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        retry_delay = _RETRY_DELAY_MIN
         while True:
             try:
-                fileno = os.open(self.path, os.O_RDWR | os.O_CREAT, mode=self.mode)
+                fileno = os.open(self._path_str, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC | os.O_NOFOLLOW, mode=self.mode)
             except PermissionError:
                 if not self.unsafe_cleanup:
                     raise
                 self._unsafe_cleanup()
                 continue
             try:
-                fcntl.flock(fileno, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                flock(fileno, fcntl.LOCK_EX | fcntl.LOCK_NB)
             except BlockingIOError:
                 if not block:
-                    os.close(fileno)
-                    return False
-                logger.info("Waiting for PID file lock '%s'.", self.path)
-                fcntl.flock(fileno, fcntl.LOCK_EX)
+                    return fileno
+                if not self._lock_wait(fileno, deadline):
+                    return fileno
             logger.debug("PID file exclusively locked '%s'", self.path)
             # We have exclusive lock but we have to verify that it is for file that is really on FS and that it is ours
-            if not self._lock_verify(fileno):
+            try:
+                fstat = self._lock_verify(fileno)
+            except BlockingIOError:
+                # The owner is still running but it does not hold the lock we use (it locks with flock or PID was
+                # reused). We can only poll for it to terminate and thus we back off to not to spin.
+                delay = retry_delay if deadline is None else min(retry_delay, deadline - time.monotonic())
+                if not block or delay <= 0:
+                    return fileno
+                os.close(fileno)
+                time.sleep(delay)
+                retry_delay = min(retry_delay * 2, _RETRY_DELAY_MAX)
+                continue
+            if fstat is None:
                 os.close(fileno)
                 continue
             break
         # We have exclusive lock and file is owned by us from now on
-        if self.group is not None:  # Explicitly set the configured group
+        if self.group is not None and fstat.st_gid != self.group:  # Explicitly set the configured group
             os.fchown(fileno, -1, self.group)
-        os.lseek(fileno, 0, os.SEEK_SET)
-        os.truncate(fileno, 0)  # We might be overtaking it after ourself with some content so truncate.
-        os.write(fileno, str(os.getpid()).encode())
-        fcntl.flock(fileno, fcntl.LOCK_SH)  # downgrade the lock to allow others to read the content
+        os.ftruncate(fileno, 0)  # We might be overtaking it after ourself with some content so truncate.
+        os.pwrite(fileno, _MY_PID_BYTES, 0)
+        flock(fileno, fcntl.LOCK_SH)  # downgrade the lock to allow others to read the content
         self.fileno = fileno
+        self._pid_bytes = _MY_PID_BYTES
         logger.debug("PID file lock acquired '%s'", self.path)
+        return None
+
+    def _lock_wait(self, fileno: int, deadline: typing.Optional[float]) -> bool:
+        """Block until we acquire exclusive lock or deadline is reached.
+
+        Returns True if lock was acquired or False if deadline was reached. The file descriptor is closed if exception
+        is raised.
+        """
+        logger.info("Waiting for PID file lock '%s'.", self.path)
+        try:
+            if deadline is None:
+                flock(fileno, fcntl.LOCK_EX)
+            elif not flock_timeout(fileno, fcntl.LOCK_EX, deadline - time.monotonic()):
+                logger.info("Waiting for PID file lock '%s' timed out.", self.path)
+                return False
+        except BaseException:
+            os.close(fileno)
+            raise
         return True
 
     def _unsafe_cleanup(self):
         # TODO this is missing and needs to be implemented.
         raise NotImplementedError
 
-    def _lock_verify(self, fileno):
+    def _lock_verify(self, fileno: int) -> typing.Optional[os.stat_result]:
+        """Verify that locked file is the PID file and that it can be taken over by us.
+
+        Returns stat of the file if it is or None otherwise. Raises BlockingIOError if the PID in the file belongs to
+        the running process.
+        """
         fstat = os.fstat(fileno)
-        if self.path.stat().st_ino != fstat.st_ino:
+        try:
+            pthstat = os.stat(self._path_str, follow_symlinks=False)
+        except FileNotFoundError:
+            pthstat = None  # The previous owner removed it while we were waiting for the lock
+        if pthstat is None or not self._same_file(pthstat, fstat):
             logger.debug(
                 "The PID lock file was removed between us opening it and acquiring lock '%s', attempting again.",
                 self.path,
             )
-            return False
-        content = os.read(fileno, io.DEFAULT_BUFFER_SIZE).decode()
+            return None
+        # Note: the ownership check has to come only after this one as otherwise we could remove the file that is
+        # still used by some other user's running process.
+        content = os.pread(fileno, _PID_READ_SIZE, 0)
         if content and pid_is_running(int(content)):
-            # We downgrade from exclusive lock to shared one later on. That is implemented in kernel as unlock and
-            # only then new lock. After unlock the lock can be assigned to any process waiting for lock. Thus we
-            # have to check if the original author is not running and release it if it does.
+            # We downgrade from exclusive lock to shared one later on. With open file description locks that conversion
+            # is atomic but with the flock fallback it is implemented in kernel as unlock and only then new lock. After
+            # unlock the lock can be assigned to any process waiting for lock. Thus we have to check if the original
+            # author is not running and release it if it does.
             logger.debug(
-                "The PID the file '%s' contains belongs to the running process %s. Attempting again.",
+                "The PID the file '%s' contains belongs to the running process %d.",
                 self.path,
-                content,
+                int(content),
             )
-            return False
+            raise BlockingIOError(errno.EAGAIN, os.strerror(errno.EAGAIN))
         if fstat.st_uid != os.getuid():
             logger.debug(
                 "The PID lock file is not owned by us '%s' but by UID %d. Removing the file and attempting again.",
                 self.path,
                 fstat.st_uid,
             )
-            self.path.unlink()
-            return False
-        return True
+            os.unlink(self._path_str)
+            return None
+        return fstat
 
     def unlock(self, block: bool = False) -> None:
         """Remove the PID file.
@@ -139,19 +225,22 @@ class PIDLock(_PIDBase):
           instances as blocking here prevents issues where PIDFile process tries to communicate with terminated PIDLock
           process.
         """
-        assert self.fileno is not None, "Lock is already free."
+        fileno = self.fileno
+        if fileno is None:
+            raise RuntimeError("Lock is already free.")
         if block:
             try:
-                fcntl.flock(self.fileno, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                flock(fileno, fcntl.LOCK_EX | fcntl.LOCK_NB)
             except BlockingIOError:
                 logger.info("Waiting for all locks to be unlocked '%s'.", self.path)
-                fcntl.flock(self.fileno, fcntl.LOCK_EX)
+                flock(fileno, fcntl.LOCK_EX)
         try:
-            self.path.unlink()
+            os.unlink(self._path_str)
         except FileNotFoundError:
             pass  # We want to remove it so if somehow it is removed we just ignore the error
-        os.close(self.fileno)  # We close only after unlink to make sure that we still hold the lock in the meantime
+        os.close(fileno)  # We close only after unlink to make sure that we still hold the lock in the meantime
         self.fileno = None
+        self._pid_bytes = None
 
     def __enter__(self):
         """Enter context with locked file.
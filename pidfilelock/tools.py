@@ -1,9 +1,25 @@
 """Internal utility tools."""
+import errno
+import fcntl
 import os
+import signal
+import struct
+import sys
+import time
+
+# The process can be checked by its presence in procfs. We check the init process to detect the case when procfs is not
+# mounted or hides processes of other users (hidepid=2) and fall back to kill in such case.
+_PROCFS = sys.platform.startswith("linux") and os.access("/proc/1", os.F_OK)
+
+# Open file description locks are available only on Linux and Python exports the constants only since 3.9.
+_F_OFD_SETLK = getattr(fcntl, "F_OFD_SETLK", 37) if sys.platform.startswith("linux") else None
+_F_OFD_SETLKW = getattr(fcntl, "F_OFD_SETLKW", 38) if sys.platform.startswith("linux") else None
 
 
 def pid_is_running(pid: int) -> bool:
     """Check if process with given PID is running."""
+    if _PROCFS:
+        return os.access(f"/proc/{pid}", os.F_OK)
     try:
         os.kill(pid, 0)
     except PermissionError:
@@ -11,3 +27,70 @@ def pid_is_running(pid: int) -> bool:
     except ProcessLookupError:
         return False
     return True
+
+
+def flock(fileno: int, operation: int) -> None:
+    """Apply lock operation on the whole file the same way as fcntl.flock does.
+
+    This uses open file description locks if they are available. They are bound to the open file description the same
+    way as flock locks are but unlike those they work on network file systems as well. It falls back to the flock on
+    kernels and file systems that do not support them.
+    """
+    if _F_OFD_SETLK is not None:
+        if operation & fcntl.LOCK_UN:
+            ltype = fcntl.F_UNLCK
+        elif operation & fcntl.LOCK_EX:
+            ltype = fcntl.F_WRLCK
+        else:
+            ltype = fcntl.F_RDLCK
+        cmd = _F_OFD_SETLK if operation & (fcntl.LOCK_NB | fcntl.LOCK_UN) else _F_OFD_SETLKW
+        try:
+            fcntl.fcntl(fileno, cmd, struct.pack("hhqql", ltype, os.SEEK_SET, 0, 0, 0))
+            return
+        except PermissionError as exc:
+            # Conflicting lock can be reported with EACCES as well as with EAGAIN
+            raise BlockingIOError(errno.EAGAIN, os.strerror(errno.EAGAIN)) from exc
+        except OSError as exc:
+            if exc.errno not in (errno.EINVAL, errno.ENOTSUP, errno.ENOLCK):
+                raise
+    fcntl.flock(fileno, operation)
+
+
+def _timeout_handler(signum, frame):  # pylint: disable=unused-argument
+    raise TimeoutError
+
+
+def flock_timeout(fileno: int, operation: int, timeout: float) -> bool:
+    """Apply blocking lock operation the same way as flock but give up after given number of seconds.
+
+    The wait is interrupted by SIGALRM and thus this can be called only from the main thread. The SIGALRM handler and
+    interval timer that were set before are restored afterwards. It refuses to run with RuntimeError if they can't be
+    restored correctly, that is if SIGALRM handler was not installed from Python or if the interval timer is due
+    sooner than the timeout.
+
+    Returns True if lock was acquired or False if timeout elapsed. Note that in a rare case the lock can be acquired
+    just before the timeout elapses and False is still returned. The caller should close the file descriptor on False.
+    """
+    if timeout <= 0:
+        return False
+    if signal.getsignal(signal.SIGALRM) is None:
+        raise RuntimeError("SIGALRM handler was not installed from Python and thus it can't be restored.")
+    old_timer, old_interval = signal.getitimer(signal.ITIMER_REAL)
+    if 0 < old_timer < timeout:
+        raise RuntimeError("Interval timer is due sooner than the timeout.")
+    start = time.monotonic()
+    previous = signal.signal(signal.SIGALRM, _timeout_handler)
+    try:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                flock(fileno, operation)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except TimeoutError:
+            return False
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+        if old_timer > 0:
+            signal.setitimer(signal.ITIMER_REAL, max(old_timer - (time.monotonic() - start), 0.000001), old_interval)
+    return True
@@ -33,8 +33,10 @@ def mklockdir(
     path.mkdir(mode=mode, parents=parents, exist_ok=exist_ok)
     uid = user if isinstance(user, int) else pwd.getpwnam(user).pw_uid
     gid = group if isinstance(group, int) else grp.getgrnam(group).gr_gid
+    if uid == -1 and gid == -1:
+        return  # Nothing to change
     pthstat = path.stat()
-    if uid in (-1, pthstat.st_uid) or gid in (-1, pthstat.st_gid):
+    if uid not in (-1, pthstat.st_uid) or gid not in (-1, pthstat.st_gid):
         # Note: we can't change ownership if we are not owner. This results in exception. We intentionally cause it here
         # to report it as an error if uid or gid not matches.
         os.chown(path, uid, gid)
@@ -59,13 +61,18 @@ def opportunistic_lock(
     # We have to attempt in the cycle because we do not have any mechanism to try to lock for both. Thus we try one
     # after the other and see which one is the successful.
     while True:
-        if pidlock.lock(block=False):
+        fileno = pidlock._lock(block=False)  # pylint: disable=protected-access
+        if fileno is None:
             try:
                 yield pidlock
             finally:
                 pidlock.unlock(unlock_block)
             return
-        with pidfile as _:
-            if pidfile.is_running:
-                yield pidfile
-                return
+        # We reuse the PID file that is locked by someone else instead of opening it again
+        if pidfile.adopt(fileno):
+            try:
+                if pidfile.is_running:
+                    yield pidfile
+                    return
+            finally:
+                pidfile.unlock()
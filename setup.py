@@ -9,6 +9,6 @@ setup(
     author="CZ.NIC, z. s. p. o.",
     author_email="packaging@turris.cz",
     license="GPL-3.0-or-later",
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     packages=["pidfilelock"],
 )
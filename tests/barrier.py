@@ -1,7 +1,31 @@
-"""We need to perform tests on multiple processes and thus we need multiprocess barriers but based on named pipes."""
+"""We need to perform tests on multiple processes and thus we need multiprocess barriers.
+
+They are based on eventfd on Linux and on named pipes elsewhere.
+"""
 import abc
+import ctypes
+import ctypes.util
 import os
 import pathlib
+import select
+import subprocess
+import sys
+import time
+import typing
+
+EVENTFD = sys.platform.startswith("linux")
+
+
+def _eventfd() -> int:
+    """Create new eventfd file descriptor."""
+    if hasattr(os, "eventfd"):
+        return os.eventfd(0)
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fileno = libc.eventfd(0, 0)
+    if fileno < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return fileno
 
 
 class _Barrier(abc.ABC):
@@ -37,10 +61,8 @@ class WBarrier(_Barrier):
 
     def invoke(self, count: int = 1):
         """Invoke barrier the given number of times."""
-        while count > 0:
-            os.write(self.fileno, self.count.to_bytes(1, "big"))
-            count -= 1
-            self.count += 1
+        os.write(self.fileno, bytes((self.count + i) % 256 for i in range(count)))
+        self.count += count
 
 
 class RBarrier(_Barrier):
@@ -56,6 +78,54 @@ class RBarrier(_Barrier):
     def wait(self, count: int = 1):
         """Wait for given number of barrier wakes."""
         while count > 0:
-            os.read(self.fileno, 1)
-            count -= 1
-            self.count += 1
+            received = len(os.read(self.fileno, count))
+            if received == 0:
+                raise EOFError(f"Write side of the barrier '{self.path}' was closed.")
+            count -= received
+            self.count += received
+
+
+class EventfdBarrier:
+    """Barrier implementing both invoke and wait using eventfd.
+
+    It has to be created before subprocess is spawned and its file descriptor passed to it. Unlike fifo the eventfd
+    never reports that the other side is gone and thus waiting is limited by timeout and it can also watch the process
+    that is expected to invoke it.
+    """
+
+    TIMEOUT = 10  # The maximum number of seconds to wait for single wake
+
+    def __init__(self, fileno: typing.Optional[int] = None):
+        """Create new eventfd or use the existing one.
+
+        fileno: file descriptor of eventfd inherited from the parent process
+        """
+        self.fileno = _eventfd() if fileno is None else fileno
+        self.count = 0
+        self.pending = 0
+        self.process: typing.Optional[subprocess.Popen] = None  # The process that is expected to invoke this barrier
+
+    def close(self):
+        """Close the barrier eventfd."""
+        os.close(self.fileno)
+
+    def invoke(self, count: int = 1):
+        """Invoke barrier the given number of times."""
+        os.write(self.fileno, count.to_bytes(8, sys.byteorder))
+        self.count += count
+
+    def wait(self, count: int = 1):
+        """Wait for given number of barrier wakes."""
+        poll = select.poll()
+        poll.register(self.fileno, select.POLLIN)
+        deadline = time.monotonic() + self.TIMEOUT
+        while self.pending < count:
+            if not poll.poll(100):
+                if self.process is not None and self.process.poll() is not None:
+                    raise EOFError(f"Process {self.process.pid} invoking the barrier terminated.")
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Barrier was not invoked in time.")
+                continue
+            self.pending += int.from_bytes(os.read(self.fileno, 8), sys.byteorder)
+        self.pending -= count
+        self.count += count
@@ -10,8 +10,12 @@ from . import barrier
 def main():
     tmp_path = pathlib.Path(sys.argv[1])
     lockpath = tmp_path / "lock"
-    b_up = barrier.RBarrier(tmp_path / "barrier-lock-up")
-    b_sub = barrier.WBarrier(tmp_path / "barrier-lock")
+    if len(sys.argv) > 2:
+        b_up = barrier.EventfdBarrier(int(sys.argv[2]))
+        b_sub = barrier.EventfdBarrier(int(sys.argv[3]))
+    else:
+        b_up = barrier.RBarrier(tmp_path / "barrier-lock-up")
+        b_sub = barrier.WBarrier(tmp_path / "barrier-lock")
 
     lock = PIDLock(lockpath)
     lock.lock(block=True)
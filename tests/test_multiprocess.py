@@ -1,6 +1,9 @@
 """Test in subprocess after fork."""
+import os
 import subprocess
 import sys
+import threading
+import time
 
 import pytest
 
@@ -9,22 +12,36 @@ from pidfilelock import PIDFile, PIDLock
 from . import barrier
 
 
-def python_test_script(name, *args):
+def python_test_script(name, *args, fds=()):
     return subprocess.Popen(
-        [sys.executable, "-m", f"tests.{name}", *args],
+        [sys.executable, "-m", f"tests.{name}", *args, *(str(fd) for fd in fds)],
         env={"PYTHONPATH": ":".join(sys.path)},
+        pass_fds=fds,
     )
 
 
 @pytest.fixture(name="subproc_lock")
 def fixture_subproc_lock(tmp_path):
     lockpath = tmp_path / "lock"
-    with python_test_script("subprocess_lock", tmp_path) as subproc:
+    if barrier.EVENTFD:
+        b_up = barrier.EventfdBarrier()
+        b_sub = barrier.EventfdBarrier()
+        subproc = python_test_script("subprocess_lock", tmp_path, fds=(b_up.fileno, b_sub.fileno))
+        b_sub.process = subproc
+    else:
+        subproc = python_test_script("subprocess_lock", tmp_path)
         b_up = barrier.WBarrier(tmp_path / "barrier-lock-up")
         b_sub = barrier.RBarrier(tmp_path / "barrier-lock")
-        b_sub.wait()
-        yield lockpath, b_up, b_sub, subproc
-        subproc.kill()
+    try:
+        with subproc:
+            try:
+                b_sub.wait()
+                yield lockpath, b_up, b_sub, subproc
+            finally:
+                subproc.kill()
+    finally:
+        b_up.close()
+        b_sub.close()
 
 
 def test_two_locks(subproc_lock):
@@ -37,6 +54,47 @@ def test_two_locks(subproc_lock):
     assert lock.lock(block=False)
 
 
+def wait_for_blocked_lock(path):
+    """Wait till there is someone blocked waiting for lock on the given file."""
+    ino = str(os.stat(path).st_ino)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        with open("/proc/locks", encoding="utf-8") as file:
+            for fields in (line.split() for line in file):
+                if fields[1] == "->" and fields[6].rsplit(":", 1)[1] == ino:
+                    return
+        time.sleep(0.01)
+    raise TimeoutError(f"Nobody started to wait for lock on '{path}'.")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/locks"), reason="Blocked lock can be detected only with /proc/locks")
+def test_lock_handoff(subproc_lock):
+    """Test that blocked lock is acquired once the other process unlocks it."""
+    lockpath, b_up, b_sub, _ = subproc_lock
+    lock = PIDLock(lockpath)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(lock.lock()))
+    thread.start()
+    wait_for_blocked_lock(lockpath)
+    b_up.invoke()
+    b_sub.wait()
+    thread.join()
+    assert result == [True]
+    assert PIDFile(lockpath).pid == os.getpid()
+    lock.unlock()
+
+
+def test_lock_timeout(subproc_lock):
+    """Test that lock gives up after timeout."""
+    lockpath, b_up, _, _ = subproc_lock
+    lock = PIDLock(lockpath)
+    start = time.monotonic()
+    assert not lock.lock(timeout=0.1)
+    assert time.monotonic() - start >= 0.1
+    assert not lock.is_locked
+    b_up.invoke()
+
+
 def test_pid(subproc_lock):
     """Test the PID file content."""
     lockpath, b_up, _, subproc = subproc_lock
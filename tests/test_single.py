@@ -1,5 +1,16 @@
 """Test locks from same process."""
+import contextlib
+import errno
+import fcntl
 import os
+import pathlib
+import signal
+import struct
+import sys
+import threading
+import time
+
+import pytest
 
 from pidfilelock import PIDFile, PIDLock, mklockdir, opportunistic_lock
 
@@ -18,6 +29,105 @@ def test_two_locks(tmp_path):
     assert not lockpath.exists()
 
 
+def test_double_lock(tmp_path):
+    """Test that lock can't be taken or released twice by the same instance."""
+    lockpath = tmp_path / "lock"
+    lock = PIDLock(lockpath)
+    lock.lock()
+    with pytest.raises(RuntimeError):
+        lock.lock()
+    lock.unlock()
+    with pytest.raises(RuntimeError):
+        lock.unlock()
+
+
+def test_running_owner(tmp_path):
+    """Test that non-blocking lock gives up if PID file contains PID of running process."""
+    lockpath = tmp_path / "lock"
+    lockpath.write_text(str(os.getpid()))
+    assert not PIDLock(lockpath).lock(block=False)
+    assert lockpath.exists()
+
+
+def test_running_owner_timeout(tmp_path):
+    """Test that waiting for running owner of PID file that does not hold the lock does not spin."""
+    lockpath = tmp_path / "lock"
+    lockpath.write_text(str(os.getpid()))
+    start, cpu_start = time.monotonic(), time.process_time()
+    assert not PIDLock(lockpath).lock(timeout=0.5)
+    assert time.monotonic() - start >= 0.5
+    assert time.process_time() - cpu_start < 0.1
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Open file description locks are Linux specific")
+def test_ofd_lock(tmp_path):
+    """Test that open file description lock is used."""
+    lockpath = tmp_path / "lock"
+    with PIDLock(lockpath) as _:
+        fileno = os.open(lockpath, os.O_RDWR)
+        try:
+            getlk = getattr(fcntl, "F_OFD_GETLK", 36)  # Python exports the constant only since 3.9
+            res = fcntl.fcntl(fileno, getlk, struct.pack("hhqql", fcntl.F_WRLCK, os.SEEK_SET, 0, 0, 0))
+        finally:
+            os.close(fileno)
+        assert struct.unpack("hhqql", res)[0] == fcntl.F_RDLCK
+
+
+def test_lock_timeout_itimer(tmp_path):
+    """Test that lock with timeout restores the previously armed interval timer."""
+    lockpath = tmp_path / "lock"
+    previous = signal.signal(signal.SIGALRM, lambda *_: None)
+    signal.setitimer(signal.ITIMER_REAL, 5, 5)
+    try:
+        with PIDLock(lockpath) as _:
+            assert not PIDLock(lockpath).lock(timeout=0.05)
+        remaining, interval = signal.getitimer(signal.ITIMER_REAL)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    assert 4 < remaining <= 5
+    assert interval == 5
+
+
+def test_lock_timeout_itimer_sooner(tmp_path):
+    """Test that lock with timeout is refused if interval timer is due sooner than the timeout."""
+    lockpath = tmp_path / "lock"
+    previous = signal.signal(signal.SIGALRM, lambda *_: None)
+    signal.setitimer(signal.ITIMER_REAL, 5)
+    try:
+        with PIDLock(lockpath) as _:
+            lock = PIDLock(lockpath)
+            with pytest.raises(RuntimeError):
+                lock.lock(timeout=10)
+            assert not lock.is_locked
+        remaining, _ = signal.getitimer(signal.ITIMER_REAL)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+    assert 4 < remaining <= 5
+
+
+def test_lock_timeout_thread(tmp_path):
+    """Test that lock with timeout is refused outside of the main thread without leaking file descriptor."""
+    lockpath = tmp_path / "lock"
+    fds = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+    result = []
+
+    def locker():
+        try:
+            PIDLock(lockpath).lock(timeout=1)
+        except ValueError:
+            result.append(True)
+
+    thread = threading.Thread(target=locker)
+    thread.start()
+    thread.join()
+    assert result == [True]
+    assert not lockpath.exists()
+    if fds is not None:
+        assert len(os.listdir("/proc/self/fd")) == fds
+
+
 def test_pid(tmp_path):
     """Test the client ability to get PID."""
     lockpath = tmp_path / "lock"
@@ -44,6 +154,72 @@ def test_context(tmp_path):
     assert not lockpath.exists()
 
 
+def test_context_missing(tmp_path):
+    """Test that context of PIDFile can be left even if there is no PID file."""
+    with PIDFile(tmp_path / "lock") as (file, locked):
+        assert not locked
+        assert not file.is_locked
+
+
+def test_slots(tmp_path):
+    """Test that instances have no __dict__ but are still context managers."""
+    for obj in (PIDLock(tmp_path / "lock"), PIDFile(tmp_path / "lock")):
+        assert isinstance(obj, contextlib.AbstractContextManager)
+        with pytest.raises(AttributeError):
+            obj.bogus = 1
+
+
+def test_adopt(tmp_path):
+    """Test that PIDFile can adopt already opened PID file."""
+    lockpath = tmp_path / "lock"
+    with PIDLock(lockpath) as _:
+        file = PIDFile(lockpath)
+        assert file.adopt(os.open(lockpath, os.O_RDONLY))
+        assert file.pid == os.getpid()
+        fileno = os.open(lockpath, os.O_RDONLY)
+        with pytest.raises(RuntimeError):
+            file.adopt(fileno)
+        with pytest.raises(OSError):
+            os.fstat(fileno)  # The file descriptor was closed
+        file.unlock()
+
+
+def test_pid_fork(tmp_path):
+    """Test that PID written by the forked child is the child's one."""
+    lockpath = tmp_path / "lock"
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            lock = PIDLock(lockpath)
+            lock.lock()
+            status = 0 if PIDFile(lockpath).pid == os.getpid() else 1
+        finally:
+            os._exit(status)  # Intentionally leave the file in place and never return to pytest
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+    assert int(lockpath.read_text()) == pid
+
+
+def test_cloexec(tmp_path):
+    """Test that PID file descriptors are not leaked to executed children."""
+    lockpath = tmp_path / "lock"
+    with PIDLock(lockpath) as lock:
+        assert fcntl.fcntl(lock.fileno, fcntl.F_GETFD) & fcntl.FD_CLOEXEC
+        with PIDFile(lockpath) as (file, _):
+            assert fcntl.fcntl(file.fileno, fcntl.F_GETFD) & fcntl.FD_CLOEXEC
+
+
+def test_symlink(tmp_path):
+    """Test that lock is not taken through symbolic link."""
+    lockpath = tmp_path / "lock"
+    lockpath.symlink_to(tmp_path / "target")
+    with pytest.raises(OSError) as excinfo:
+        PIDLock(lockpath).lock()
+    assert excinfo.value.errno == errno.ELOOP
+    assert not (tmp_path / "target").exists()
+
+
 def test_is_running(tmp_path):
     """Test the client ability to get PID."""
     lockpath = tmp_path / "lock"
@@ -79,3 +255,24 @@ def test_mklockdir(tmp_path):
     assert not lockpath.exists()
     lockdir.rmdir()
     lockdir.parent.rmdir()
+
+
+def test_mklockdir_owner(tmp_path, monkeypatch):
+    """Test that mklockdir changes ownership only when it does not match."""
+    chowns = []
+    monkeypatch.setattr(os, "chown", lambda *args: chowns.append(args))
+    mklockdir(tmp_path / "matching", user=os.getuid(), group=os.getgid())
+    assert not chowns
+    mklockdir(tmp_path / "mismatch", group=os.getgid() + 1)
+    assert chowns == [(tmp_path / "mismatch", -1, os.getgid() + 1)]
+
+
+def test_mklockdir_default(tmp_path, monkeypatch):
+    """Test that mklockdir with default ownership neither inspects nor changes it."""
+    calls = []
+    monkeypatch.setattr(os, "chown", lambda *args: calls.append("chown"))
+    monkeypatch.setattr(pathlib.Path, "stat", lambda *args, **kwargs: calls.append("stat"))
+    mklockdir(tmp_path / "dir")
+    monkeypatch.undo()
+    assert not calls
+    assert (tmp_path / "dir").is_dir()